@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Generate Home Assistant pre- and post-Shabbat automations for a device fleet.
+
+Reads a Zigbee2MQTT devices export (the payload of zigbee2mqtt/bridge/devices)
+and writes one automation file per device whose model has a Shabbat profile.
+Payloads are checked against the ranges in the "Configurable Parameters"
+table of the presence sensor specification before anything is written, and
+files are only rewritten for devices whose automations changed.
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+# Base paths
+BASE_DIR = Path(__file__).parent
+OUTPUT_DIR = BASE_DIR / "output" / "automations"
+MANIFEST_FILE = ".manifest.json"
+
+# Names generate_automations() writes, i.e. f"{device_slug(device)}.yaml"
+_GENERATED_FILE = re.compile(r"[a-z0-9_]+\.yaml")
+
+DEFAULT_SHABBAT_ENTITY = "binary_sensor.shabbat"
+
+# "Configurable Parameters" table for the ZG-204ZM. 'range' is (min, max)
+# for numeric parameters, or the tuple of allowed values for enums; 'step'
+# is the increment numeric values must be a multiple of (1 = whole numbers).
+# The presence sensor PDF builds its table from this.
+PRESENCE_PARAMETERS = {
+    'fading_time': {
+        'label': 'Fading Time', 'range': (0, 28800), 'step': 1, 'unit': 'seconds',
+        'description': 'Presence keep time',
+    },
+    'static_detection_distance': {
+        'label': 'Static Detection Distance', 'range': (0, 6), 'step': 0.01, 'unit': 'meters',
+        'description': 'Radar detection range',
+    },
+    'static_detection_sensitivity': {
+        'label': 'Static Detection Sensitivity', 'range': (0, 10), 'step': 1, 'unit': 'x',
+        'description': 'Radar sensitivity multiplier',
+    },
+    'indicator': {
+        'label': 'Indicator', 'range': ('OFF', 'ON'), 'unit': '-',
+        'description': 'LED indicator mode',
+    },
+    'motion_detection_mode': {
+        'label': 'Motion Detection Mode', 'range': ('only_pir', 'pir_and_radar', 'only_radar'),
+        'unit': '-', 'description': 'Detection method',
+    },
+    'motion_detection_sensitivity': {
+        'label': 'Motion Detection Sensitivity', 'range': (0, 10), 'step': 1, 'unit': 'x',
+        'description': 'PIR/motion sensitivity',
+    },
+}
+
+# Zigbee model -> Shabbat profile. Door/window contact sensors (TS0203,
+# MCCGQ11LM) have no device-specific settings, so they get no profile.
+PROFILES = {
+    'ZG-204ZM': {
+        'label': "Presence Sensor",
+        'parameters': PRESENCE_PARAMETERS,
+        'pre_shabbat': {
+            'static_detection_distance': 0,
+            'static_detection_sensitivity': 0,
+            'motion_detection_sensitivity': 0,
+        },
+        'post_shabbat': {
+            'static_detection_distance': 4,
+            'static_detection_sensitivity': 6,
+            'motion_detection_sensitivity': 6,
+        },
+    },
+}
+
+AUTOMATION_TEMPLATE = '''# Generated by generate_automations.py - UNTESTED, conceptual only
+automation:
+  - id: {id_prefix}_pre_shabbat
+    alias: {pre_alias}
+    trigger:
+      - platform: state
+        entity_id: {shabbat_entity}
+        to: 'on'
+    action:
+      - service: mqtt.publish
+        data:
+          topic: {topic}
+          payload: '{pre_payload}'
+
+  - id: {id_prefix}_post_shabbat
+    alias: {post_alias}
+    trigger:
+      - platform: state
+        entity_id: {shabbat_entity}
+        to: 'off'
+    action:
+      - service: mqtt.publish
+        data:
+          topic: {topic}
+          payload: '{post_payload}'
+'''
+
+
+def is_enum(spec):
+    return isinstance(spec['range'][0], str)
+
+
+def format_range(spec):
+    """Return a parameter's range as shown in the Configurable Parameters table."""
+    if is_enum(spec):
+        return " / ".join(spec['range'])
+    low, high = spec['range']
+    return f"{low}-{high}"
+
+
+def compile_validator(parameters):
+    """Compile a parameter table into a single payload validation function.
+
+    The returned function takes a payload dict and returns a list of error
+    messages (empty if the payload is valid).
+    """
+    checks = {}
+    for name, spec in parameters.items():
+        if is_enum(spec):
+            allowed = frozenset(spec['range'])
+            check = lambda v, allowed=allowed: isinstance(v, str) and v in allowed
+            checks[name] = (check, format_range(spec))
+            continue
+        low, high = spec['range']
+        step = spec['step']
+        if step == 1:
+            check = (lambda v, low=low, high=high:
+                     (type(v) is int or type(v) is float and v.is_integer()) and low <= v <= high)
+        else:
+            check = (lambda v, low=low, high=high, step=step:
+                     isinstance(v, (int, float)) and not isinstance(v, bool) and low <= v <= high
+                     and abs((v - low) / step - round((v - low) / step)) < 1e-9)
+        checks[name] = (check, f"{format_range(spec)} in steps of {step}")
+
+    def validate(payload):
+        errors = []
+        for name, value in payload.items():
+            check = checks.get(name)
+            if check is None:
+                errors.append(f"{name}: unknown parameter")
+            elif not check[0](value):
+                errors.append(f"{name}: {value!r} outside {check[1]}")
+        return errors
+
+    return validate
+
+
+def slugify(name):
+    """Return an automation id prefix for a device name."""
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip('_')
+
+
+def device_slug(device):
+    """Return the file name and id prefix for a device.
+
+    Names containing non-ASCII characters (e.g. Hebrew room names) would
+    lose them in the slug, so the device's IEEE address is appended to
+    keep "סלון 1" and "מטבח 1" apart.
+    """
+    name = device['friendly_name']
+    parts = [slugify(name)]
+    if not name.isascii():
+        parts.append(slugify(device.get('ieee_address') or ''))
+    slug = '_'.join(part for part in parts if part)
+    if not slug:
+        raise ValueError(f"{name}: no usable name or ieee_address for a file name")
+    return slug
+
+
+class AutomationGenerator:
+    """Render Shabbat automations for devices, validating each distinct payload once."""
+
+    def __init__(self, profiles=PROFILES, shabbat_entity=DEFAULT_SHABBAT_ENTITY):
+        self.profiles = profiles
+        self.shabbat_entity = shabbat_entity
+        # One compiled validator per parameter table, shared by every profile using it
+        validators = {}
+        self._validators = {}
+        for model, profile in profiles.items():
+            table = profile['parameters']
+            if id(table) not in validators:
+                validators[id(table)] = compile_validator(table)
+            self._validators[model] = validators[id(table)]
+        self._payloads = {}
+
+    def _payload_json(self, model, payload):
+        """Validate a payload and return it as compact JSON, memoized by content."""
+        # Keyed by the serialized payload, since override values may be
+        # unhashable (lists, dicts) until validation has rejected them
+        key = (model, json.dumps(payload, sort_keys=True))
+        text = self._payloads.get(key)
+        if text is None:
+            errors = self._validators[model](payload)
+            if errors:
+                raise ValueError(f"Invalid {model} payload: {'; '.join(errors)}")
+            text = self._payloads[key] = json.dumps(payload, separators=(', ', ': '))
+        return text
+
+    def profile_for(self, device):
+        """Return the Shabbat profile for a Z2M device entry, or None."""
+        if device.get('disabled'):
+            return None
+        definition = device.get('definition') or {}
+        return self.profiles.get(definition.get('model'))
+
+    def render(self, device, slug=None):
+        """Return the automation YAML for a Z2M device entry, or None if it has no profile.
+
+        A device entry may carry "pre_shabbat"/"post_shabbat" dicts that
+        override its profile's payload values. slug is the automation id
+        prefix (default: device_slug(device)).
+        """
+        profile = self.profile_for(device)
+        if profile is None:
+            return None
+        model = device['definition']['model']
+
+        name = device['friendly_name']
+        payloads = {}
+        for phase in ('pre_shabbat', 'post_shabbat'):
+            payload = profile[phase]
+            if device.get(phase):
+                payload = {**payload, **device[phase]}
+            try:
+                payloads[phase] = self._payload_json(model, payload)
+            except ValueError as e:
+                raise ValueError(f"{name}: {e}") from None
+
+        label = profile['label']
+        return AUTOMATION_TEMPLATE.format(
+            id_prefix=slug or device_slug(device),
+            pre_alias=json.dumps(f"{label} - {name} - Pre-Shabbat Disable", ensure_ascii=False),
+            post_alias=json.dumps(f"{label} - {name} - Post-Shabbat Enable", ensure_ascii=False),
+            shabbat_entity=self.shabbat_entity,
+            topic=json.dumps(f"zigbee2mqtt/{name}/set", ensure_ascii=False),
+            pre_payload=payloads['pre_shabbat'],
+            post_payload=payloads['post_shabbat'],
+        )
+
+
+def generate_automations(devices, output_dir=OUTPUT_DIR, shabbat_entity=DEFAULT_SHABBAT_ENTITY):
+    """Write automation files for a fleet, skipping devices whose output is unchanged.
+
+    Every device is rendered and validated before any file is written, so an
+    invalid payload leaves the output directory untouched. A device whose
+    file name collides with an earlier device's gets its IEEE address
+    appended; if it still collides it is skipped and reported in 'errors'
+    rather than stopping the rest of the fleet. Files for devices that no
+    longer have automations are removed. Returns a dict of counts and the
+    list of errors.
+    """
+    generator = AutomationGenerator(shabbat_entity=shabbat_entity)
+    rendered = {}
+    errors = []
+    skipped = 0
+    for device in devices:
+        if generator.profile_for(device) is None:
+            skipped += 1
+            continue
+        name = device['friendly_name']
+        try:
+            slug = device_slug(device)
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if f"{slug}.yaml" in rendered:
+            ieee = slugify(device.get('ieee_address') or '')
+            if ieee and not slug.endswith(ieee):
+                slug = f"{slug}_{ieee}"
+        filename = f"{slug}.yaml"
+        if filename in rendered:
+            errors.append(f"{name}: automation file {filename} already used by another device")
+            continue
+        rendered[filename] = generator.render(device, slug)
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_FILE
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    new_manifest = {}
+    written = 0
+    for filename, text in rendered.items():
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        new_manifest[filename] = digest
+        path = output_dir / filename
+        if manifest.get(filename) != digest or not path.exists():
+            path.write_text(text, encoding='utf-8')
+            written += 1
+
+    removed = 0
+    for filename in manifest.keys() - new_manifest.keys():
+        # Only ever delete generated files directly inside output_dir, even
+        # if the manifest has been edited by hand
+        if not _GENERATED_FILE.fullmatch(filename):
+            continue
+        (output_dir / filename).unlink(missing_ok=True)
+        removed += 1
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(new_manifest, f, indent=1, sort_keys=True)
+
+    return {
+        'devices': len(rendered),
+        'written': written,
+        'unchanged': len(rendered) - written,
+        'removed': removed,
+        'skipped': skipped,
+        'errors': errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('devices', help="Z2M devices export (JSON list of devices)")
+    parser.add_argument('--output', default=OUTPUT_DIR, help=f"Output directory (default: {OUTPUT_DIR})")
+    parser.add_argument('--shabbat-entity', default=DEFAULT_SHABBAT_ENTITY,
+                        help=f"Shabbat binary sensor (default: {DEFAULT_SHABBAT_ENTITY})")
+    args = parser.parse_args(argv)
+
+    with open(args.devices, encoding='utf-8') as f:
+        devices = json.load(f)
+
+    try:
+        counts = generate_automations(devices, args.output, args.shabbat_entity)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+
+    for error in counts['errors']:
+        print(f"Warning: {error}", file=sys.stderr)
+    print(
+        f"Generated automations for {counts['devices']} devices in {args.output}: "
+        f"{counts['written']} written, {counts['unchanged']} unchanged, "
+        f"{counts['removed']} removed, {counts['skipped']} without a profile, "
+        f"{len(counts['errors'])} skipped with errors"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,13 +9,18 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.colors import HexColor
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle,
+    Paragraph, Spacer, Image, Table, TableStyle,
     PageBreak, KeepTogether
 )
+from reportlab.platypus.tableofcontents import TableOfContents
 from reportlab.lib import colors
 from pathlib import Path
 import os
 
+from pdf_fonts import register_hebrew_font, hebrew_available, hebrew_markup, contains_hebrew
+from pdf_toc import IndexedDocTemplate, PageRef
+from generate_automations import PRESENCE_PARAMETERS, AutomationGenerator, format_range
+
 # Base paths
 BASE_DIR = Path(__file__).parent
 PRESENCE_DIR = BASE_DIR / "sensors" / "presence"
@@ -25,8 +30,21 @@ OUTPUT_DIR = BASE_DIR / "output"
 # Create output directory
 OUTPUT_DIR.mkdir(exist_ok=True)
 
+# Table cells with Hebrew are laid out as Paragraphs so the font markup applies
+TABLE_CELL_STYLE = ParagraphStyle(name='TableCell', fontName='Helvetica', fontSize=9, leading=11)
+
+
+def term(transliteration, hebrew):
+    """Return a halachic term, with its Hebrew if a Hebrew font is registered."""
+    if hebrew_available():
+        return f"{transliteration} ({hebrew_markup(hebrew)})"
+    return transliteration
+
+
 def get_styles():
     """Create custom styles for the PDF."""
+    # Registers once per process; the parsed font is cached on disk
+    register_hebrew_font()
     styles = getSampleStyleSheet()
 
     styles.add(ParagraphStyle(
@@ -112,6 +130,11 @@ def get_styles():
 
 def create_table(data, col_widths=None):
     """Create a styled table."""
+    data = [
+        [Paragraph(cell, TABLE_CELL_STYLE) if isinstance(cell, str) and contains_hebrew(cell) else cell
+         for cell in row]
+        for row in data
+    ]
     table = Table(data, colWidths=col_widths)
     table.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), HexColor('#edf2f7')),
@@ -129,6 +152,19 @@ def create_table(data, col_widths=None):
     return table
 
 
+def create_toc(styles):
+    """Create a table of contents listing the Title2 sections."""
+    toc = TableOfContents(dotsMinLevel=0)
+    toc.levelStyles = [ParagraphStyle(
+        name='TOCLevel0',
+        parent=styles['BodyText2'],
+        leftIndent=12,
+        spaceBefore=2,
+        spaceAfter=2
+    )]
+    return toc
+
+
 def add_image(path, width=None, caption=None, styles=None, max_height=None):
     """Add an image with optional caption, properly scaled."""
     elements = []
@@ -165,7 +201,7 @@ def add_image(path, width=None, caption=None, styles=None, max_height=None):
 def generate_presence_sensor_pdf():
     """Generate PDF for the presence sensor."""
     styles = get_styles()
-    doc = SimpleDocTemplate(
+    doc = IndexedDocTemplate(
         str(OUTPUT_DIR / "presence-sensor-specification.pdf"),
         pagesize=letter,
         rightMargin=0.75*inch,
@@ -181,6 +217,11 @@ def generate_presence_sensor_pdf():
     story.append(Paragraph("Smart Home Halacha Project - Hardware Documentation", styles['BodyText2']))
     story.append(Spacer(1, 20))
 
+    # Table of Contents
+    story.append(Paragraph("Contents", styles['Title3']))
+    story.append(create_toc(styles))
+    story.append(Spacer(1, 10))
+
     # Overview
     story.append(Paragraph("Overview", styles['Title2']))
     story.append(Paragraph(
@@ -308,14 +349,10 @@ def generate_presence_sensor_pdf():
     # Configurable Parameters
     story.append(Paragraph("Configurable Parameters", styles['Title2']))
 
-    param_data = [
-        ['Parameter', 'Range', 'Unit', 'Description'],
-        ['Fading Time', '0-28800', 'seconds', 'Presence keep time'],
-        ['Static Detection Distance', '0-6', 'meters', 'Radar detection range'],
-        ['Static Detection Sensitivity', '0-10', 'x', 'Radar sensitivity multiplier'],
-        ['Indicator', 'OFF/ON', '-', 'LED indicator mode'],
-        ['Motion Detection Mode', 'only_pir / pir_and_radar / only_radar', '-', 'Detection method'],
-        ['Motion Detection Sensitivity', '0-10', 'x', 'PIR/motion sensitivity'],
+    # Same table the automation generator validates payloads against
+    param_data = [['Parameter', 'Range', 'Unit', 'Description']] + [
+        [spec['label'], format_range(spec), spec['unit'], spec['description']]
+        for spec in PRESENCE_PARAMETERS.values()
     ]
     story.append(create_table(param_data, [1.8*inch, 1.2*inch, 0.6*inch, 2.9*inch]))
     story.append(Spacer(1, 15))
@@ -352,10 +389,12 @@ def generate_presence_sensor_pdf():
     story.append(Spacer(1, 10))
 
     story.append(Paragraph("The Concept", styles['Title3']))
-    story.append(Paragraph(
+    story.append(PageRef(
         "Since this sensor does not have a true 'disable' option, one potential workaround is to set "
-        "the detection thresholds to values that would effectively prevent any detection from occurring.",
-        styles['BodyText2']
+        "the detection thresholds to values that would effectively prevent any detection from occurring "
+        "(see Configurable Parameters, page {page:configurable-parameters}, for the allowed ranges).",
+        styles['BodyText2'],
+        doc.page_map
     ))
     story.append(Spacer(1, 6))
     story.append(Paragraph(
@@ -387,34 +426,11 @@ def generate_presence_sensor_pdf():
     story.append(Paragraph("Sample Home Assistant Automation", styles['Title3']))
     story.append(Paragraph("<i>UNTESTED - Conceptual only</i>", styles['BodyText2']))
 
-    automation_yaml = '''automation:
-  - alias: "Presence Sensor - Pre-Shabbat Disable"
-    trigger:
-      - platform: state
-        entity_id: binary_sensor.shabbat
-        to: 'on'
-    action:
-      - service: mqtt.publish
-        data:
-          topic: "zigbee2mqtt/living_room_presence/set"
-          payload: |
-            {"static_detection_distance": 0,
-             "static_detection_sensitivity": 0,
-             "motion_detection_sensitivity": 0}
-
-  - alias: "Presence Sensor - Post-Shabbat Enable"
-    trigger:
-      - platform: state
-        entity_id: binary_sensor.shabbat
-        to: 'off'
-    action:
-      - service: mqtt.publish
-        data:
-          topic: "zigbee2mqtt/living_room_presence/set"
-          payload: |
-            {"static_detection_distance": 4,
-             "static_detection_sensitivity": 6,
-             "motion_detection_sensitivity": 6}'''
+    # Rendered by the fleet generator, so the sample matches its output
+    automation_yaml = AutomationGenerator().render({
+        'friendly_name': 'living_room_presence',
+        'definition': {'model': 'ZG-204ZM'},
+    }).rstrip()
 
     story.append(Paragraph(f"<font face='Courier' size='7'>{automation_yaml}</font>", styles['CodeBlock']))
 
@@ -440,7 +456,7 @@ def generate_presence_sensor_pdf():
         "Is 'effectively disabled' sufficient?",
         "What if the settings don't fully prevent detection?",
         "Is pre-Shabbat automation problematic?",
-        "Grama considerations if sensor is 'armed' at 0 sensitivity"
+        f"{term('Grama', 'גרמא')} considerations if sensor is 'armed' at 0 sensitivity"
     ]
     for q in halachic_questions:
         story.append(Paragraph(f"- {q}", styles['BodyText2']))
@@ -466,14 +482,14 @@ def generate_presence_sensor_pdf():
     ))
     story.append(Paragraph("Generated: December 2024", styles['Footer']))
 
-    doc.build(story)
+    doc.build_indexed(story)
     print(f"Generated: {OUTPUT_DIR / 'presence-sensor-specification.pdf'}")
 
 
 def generate_door_sensor_pdf():
     """Generate PDF for the door/window sensor."""
     styles = get_styles()
-    doc = SimpleDocTemplate(
+    doc = IndexedDocTemplate(
         str(OUTPUT_DIR / "door-window-sensor-specification.pdf"),
         pagesize=letter,
         rightMargin=0.75*inch,
@@ -489,6 +505,11 @@ def generate_door_sensor_pdf():
     story.append(Paragraph("Smart Home Halacha Project - Hardware Documentation", styles['BodyText2']))
     story.append(Spacer(1, 20))
 
+    # Table of Contents
+    story.append(Paragraph("Contents", styles['Title3']))
+    story.append(create_toc(styles))
+    story.append(Spacer(1, 10))
+
     # Overview
     story.append(Paragraph("Overview", styles['Title2']))
     story.append(Paragraph(
@@ -658,7 +679,8 @@ def generate_door_sensor_pdf():
         "<b>Passive Detection:</b> The sensor doesn't actively scan - it only detects the magnetic field state",
         "<b>Binary State:</b> Simple open/closed, no complex processing",
         "<b>No Disable Option:</b> Cannot be 'disabled' via software - the reed switch always responds to the magnet",
-        "<b>Direct Physical Causation:</b> Opening a door directly causes the sensor state change (not grama)"
+        "<b>Direct Physical Causation:</b> Opening a door directly causes the sensor state change "
+        f"(not {term('grama', 'גרמא')})"
     ]
     for d in differences:
         story.append(Paragraph(f"- {d}", styles['BodyText2']))
@@ -670,7 +692,7 @@ def generate_door_sensor_pdf():
         styles['BodyText2']
     ))
     questions = [
-        "Is the person considered to have 'done work' by changing an electrical state?",
+        f"Is the person considered to have 'done work' ({term('melacha', 'מלאכה')}) by changing an electrical state?",
         "Does it matter if the sensor change triggers an automation vs. simply being logged?",
         "Is the act of opening the door (permitted) separable from the sensor detection (potentially problematic)?"
     ]
@@ -683,11 +705,12 @@ def generate_door_sensor_pdf():
     approaches = [
         "<b>Disable Automations:</b> Keep sensor active but disable all Shabbat automations",
         "<b>Physical Removal:</b> Remove sensor batteries before Shabbat",
-        "<b>Z2M Disable:</b> Use the 'disabled' setting to exclude from network",
+        "<b>Z2M Disable:</b> Use the 'disabled' setting to exclude from network "
+        "(see Z2M Interface Screenshots, page {page:z2m-interface-screenshots})",
         "<b>Accept Passive Monitoring:</b> If no actions are triggered, some may permit passive state logging"
     ]
     for a in approaches:
-        story.append(Paragraph(f"- {a}", styles['BodyText2']))
+        story.append(PageRef(f"- {a}", styles['BodyText2'], doc.page_map))
     story.append(Spacer(1, 6))
 
     story.append(Paragraph(
@@ -707,7 +730,7 @@ def generate_door_sensor_pdf():
         ['Configurable Sensitivity', 'No', 'Yes'],
         ['Can Be "Disabled" via Software', 'Only via Z2M exclusion', 'Potentially via threshold settings'],
         ['Detection Trigger', 'Physical movement of door', 'Human presence/motion'],
-        ['Causation Type', 'Direct', 'Potentially grama'],
+        ['Causation Type', 'Direct', f"Potentially {term('grama', 'גרמא')}"],
         ['Battery Life', '2+ years', 'Variable'],
     ]
     story.append(create_table(compare_data, [2*inch, 2.25*inch, 2.25*inch]))
@@ -722,7 +745,7 @@ def generate_door_sensor_pdf():
     ))
     story.append(Paragraph("Generated: December 2024", styles['Footer']))
 
-    doc.build(story)
+    doc.build_indexed(story)
     print(f"Generated: {OUTPUT_DIR / 'door-window-sensor-specification.pdf'}")
 
 
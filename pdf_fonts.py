@@ -0,0 +1,226 @@
+"""
+Shared font registration for the Smart Home Halacha PDF generators.
+
+The built-in Helvetica/Courier fonts have no Hebrew glyphs, so Hebrew terms
+(grama, pesik reisha, melacha, ...) need a TrueType font. Parsing a TTF and
+building its glyph subsets is repeated by every process that builds a
+document, so both are cached on disk and shared across documents and
+worker processes:
+
+    .font-cache/<key>.font              parsed font (pickled TTFont)
+    .font-cache/subsets/<key>.ttf       glyph subsets embedded in PDFs
+
+Cache keys include the font file's path, size and mtime, the registered
+name, the reportlab version and CACHE_FORMAT, so replacing a font, upgrading
+reportlab or changing this module invalidates them.
+"""
+
+from reportlab import Version as REPORTLAB_VERSION
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+from pathlib import Path
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import warnings
+from weakref import WeakKeyDictionary
+
+BASE_DIR = Path(__file__).parent
+FONT_CACHE_DIR = Path(os.environ.get('HALACHA_FONT_CACHE', BASE_DIR / ".font-cache"))
+
+# Bump when the pickled classes below change shape
+CACHE_FORMAT = 2
+
+# Name the Hebrew font is registered under, for <font face='...'> markup
+HEBREW_FONT = 'Hebrew'
+
+# Searched in order when HEBREW_FONT_PATH is not set
+HEBREW_FONT_CANDIDATES = [
+    BASE_DIR / "fonts" / "NotoSansHebrew-Regular.ttf",
+    Path("/usr/share/fonts/truetype/noto/NotoSansHebrew-Regular.ttf"),
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    Path("/Library/Fonts/Arial Unicode.ttf"),
+    Path("C:/Windows/Fonts/arial.ttf"),
+]
+
+# Hebrew letters plus the points/cantillation marks that attach to them
+_HEBREW_CHARS = '\u0590-\u05ff\ufb1d-\ufb4f'
+_HEBREW_MARKS = '\u0591-\u05bd\u05bf\u05c1\u05c2\u05c4\u05c5\u05c7'
+_HEBREW_RUN = re.compile(
+    f"[{_HEBREW_CHARS}]+(?:[ \u00a0'\"\\-]+[{_HEBREW_CHARS}]+)*"
+)
+_HEBREW_CLUSTER = re.compile(f".[{_HEBREW_MARKS}]*", re.S)
+
+NBSP = '\u00a0'
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def _write_atomic(path, data):
+    """Write bytes so concurrent readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    # mkstemp creates the file 0600; give it the permissions open() would,
+    # so a cache shared between users stays readable
+    os.chmod(tmp, 0o666 & ~_umask())
+    os.replace(tmp, path)
+
+
+def _cache_key(*parts):
+    return hashlib.sha1('\0'.join(map(str, parts)).encode()).hexdigest()
+
+
+class CachedTTFontFace(TTFontFace):
+    """TTFontFace that can be pickled and caches its glyph subsets on disk."""
+
+    cache_key = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Rebuilt from unitsPerEm in __setstate__; lambdas do not pickle
+        state.pop('_pdfScale', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        scale = 1000 / self.unitsPerEm
+        self._pdfScale = (lambda x: x) if scale == 1 else (lambda x: x * scale)
+
+    def makeSubset(self, subset):
+        """Create a subset of the font, reusing a cached copy if present."""
+        if self.cache_key is None:
+            return TTFontFace.makeSubset(self, subset)
+        key = _cache_key(self.cache_key, *subset)
+        path = FONT_CACHE_DIR / "subsets" / f"{key}.ttf"
+        try:
+            return path.read_bytes()
+        except OSError:
+            pass
+        data = TTFontFace.makeSubset(self, subset)
+        _write_atomic(path, data)
+        return data
+
+
+class CachedTTFont(TTFont):
+    """TTFont that can be pickled once built by TTFont.__init__."""
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Per-document subset state; always empty in a freshly built font
+        state.pop('state', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.state = WeakKeyDictionary()
+
+
+def load_font(name, path):
+    """Return a TTFont for path, from the disk cache if possible.
+
+    On a cache miss the font is built by TTFont.__init__ as usual, so every
+    attribute reportlab sets is kept, and then pickled for later processes.
+    """
+    path = Path(path).resolve()
+    st = path.stat()
+    key = _cache_key(path, st.st_size, st.st_mtime_ns, name, REPORTLAB_VERSION, CACHE_FORMAT)
+    cached = FONT_CACHE_DIR / f"{key}.font"
+    try:
+        with open(cached, 'rb') as f:
+            font = pickle.load(f)
+        if not isinstance(font, CachedTTFont):
+            raise TypeError(f"{cached} does not hold a font")
+        return font
+    except Exception:
+        # Missing, truncated or stale (e.g. written by an older version of
+        # this module): rebuild it rather than failing every build
+        pass
+    font = CachedTTFont(name, str(path))
+    # TTFont.__init__ builds a plain TTFontFace; the subclass only adds
+    # pickling and subset caching, so it can take over the parsed face
+    font.face.__class__ = CachedTTFontFace
+    font.face.cache_key = key
+    _write_atomic(cached, pickle.dumps(font, pickle.HIGHEST_PROTOCOL))
+    return font
+
+
+def register_font(name, path):
+    """Register a TTF font under name once per process and return it."""
+    if name in pdfmetrics.getRegisteredFontNames():
+        return pdfmetrics.getFont(name)
+    font = load_font(name, path)
+    pdfmetrics.registerFont(font)
+    return font
+
+
+def find_hebrew_font():
+    """Return the path of a TTF with Hebrew glyphs, or None if none is found.
+
+    The HEBREW_FONT_PATH environment variable takes precedence over the
+    built-in candidate list; if it names a missing file a warning is issued
+    and the candidates are searched instead.
+    """
+    env_path = os.environ.get('HEBREW_FONT_PATH')
+    if env_path:
+        if Path(env_path).exists():
+            return Path(env_path)
+        warnings.warn(f"HEBREW_FONT_PATH {env_path} does not exist; searching the default fonts")
+    for path in HEBREW_FONT_CANDIDATES:
+        if path.exists():
+            return path
+    return None
+
+
+def register_hebrew_font(path=None):
+    """Register the Hebrew font as HEBREW_FONT.
+
+    Returns True on success, False if no Hebrew font is available (documents
+    then fall back to transliteration only).
+    """
+    path = path or find_hebrew_font()
+    if path is None:
+        return False
+    register_font(HEBREW_FONT, path)
+    return True
+
+
+def hebrew_available():
+    """Return True if the Hebrew font has been registered."""
+    return HEBREW_FONT in pdfmetrics.getRegisteredFontNames()
+
+
+def contains_hebrew(text):
+    return _HEBREW_RUN.search(text) is not None
+
+
+def visual_order(text):
+    """Reorder Hebrew runs within left-to-right text for display.
+
+    Each run of Hebrew words is reversed by character cluster, so points
+    stay attached to their letters and the run reads right to left, while
+    the surrounding Latin text keeps its order. Spaces inside a run become
+    non-breaking, so Paragraph never wraps a multi-word run across lines,
+    which would put its words in the wrong order. This covers the inline
+    terms and table cells used in the documents without depending on
+    reportlab's optional rlbidi support; it is not meant for whole Hebrew
+    paragraphs.
+    """
+    def reverse(match):
+        run = ''.join(reversed(_HEBREW_CLUSTER.findall(match.group(0))))
+        return run.replace(' ', NBSP)
+    return _HEBREW_RUN.sub(reverse, text)
+
+
+def hebrew_markup(text):
+    """Return Paragraph markup showing text's Hebrew runs in the Hebrew font."""
+    def wrap(match):
+        return f"<font face='{HEBREW_FONT}'>{match.group(0)}</font>"
+    return _HEBREW_RUN.sub(wrap, visual_order(text))
@@ -0,0 +1,142 @@
+"""
+Table of contents and "see page N" cross-references for the PDF generators.
+
+reportlab's multiBuild lays the whole story out at least twice to settle page
+numbers, which is slow for the screenshot-heavy documents. IndexedDocTemplate
+instead saves the page-number map of each build to .build-cache/ and seeds the
+next build with it. When pagination has not shifted the document is laid out
+once; extra passes only run when a heading lands on a different page.
+"""
+
+from reportlab.platypus import SimpleDocTemplate, Paragraph
+from reportlab.platypus.tableofcontents import TableOfContents
+from pathlib import Path
+import json
+import re
+
+BASE_DIR = Path(__file__).parent
+BUILD_CACHE_DIR = BASE_DIR / ".build-cache"
+
+# Paragraph style name -> TOC level for headings that get an entry
+TOC_LEVELS = {
+    'Title2': 0,
+}
+
+# Placeholder for a cross-reference in PageRef text, e.g. "{page:overview}"
+_PAGE_REF = re.compile(r"\{page:([\w-]+)\}")
+
+
+def anchor_key(text):
+    """Return the anchor key used for a heading, e.g. 'Critical Unknowns' -> 'critical-unknowns'."""
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip('-')
+
+
+class PageRef(Paragraph):
+    """Paragraph whose {page:key} placeholders show the page of a heading.
+
+    Page numbers come from the document's page map, which is shared with the
+    IndexedDocTemplate and updated between passes, so the text is resolved
+    at layout time rather than when the story is built.
+    """
+
+    def __init__(self, text, style, page_map):
+        self._template = text
+        self._page_map = page_map
+        self._resolved = self._resolve()
+        Paragraph.__init__(self, self._resolved, style)
+
+    def _resolve(self):
+        return _PAGE_REF.sub(lambda m: str(self._page_map.get(m.group(1), '?')), self._template)
+
+    def _update(self):
+        text = self._resolve()
+        if text != self._resolved:
+            self._resolved = text
+            Paragraph.__init__(self, text, self.style)
+
+    def wrap(self, availWidth, availHeight):
+        self._update()
+        return Paragraph.wrap(self, availWidth, availHeight)
+
+    def split(self, availWidth, availHeight):
+        # Paragraph.split rebuilds its halves through self.__class__, which
+        # PageRef's signature does not support; split as a plain Paragraph
+        # with the resolved text instead
+        self._update()
+        para = Paragraph(self._resolved, self.style)
+        return para.split(availWidth, availHeight)
+
+
+class IndexedDocTemplate(SimpleDocTemplate):
+    """SimpleDocTemplate that records heading pages for a TOC and PageRefs.
+
+    Call build_indexed() instead of build() or multiBuild().
+    """
+
+    def __init__(self, filename, **kw):
+        SimpleDocTemplate.__init__(self, filename, **kw)
+        self.cache_path = BUILD_CACHE_DIR / f"{Path(filename).stem}.pages.json"
+        self.page_map = {}
+        self._toc_entries = []
+        self._load_page_map()
+
+    def _load_page_map(self):
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.page_map.update(cached['anchors'])
+        self._toc_entries = [tuple(entry) for entry in cached['toc']]
+
+    def _save_page_map(self):
+        self.cache_path.parent.mkdir(exist_ok=True)
+        with open(self.cache_path, 'w') as f:
+            json.dump({'anchors': self.page_map, 'toc': self._toc_entries}, f, indent=1)
+
+    def afterFlowable(self, flowable):
+        """Record the page of each TOC heading."""
+        if isinstance(flowable, Paragraph) and flowable.style.name in TOC_LEVELS:
+            text = flowable.getPlainText()
+            key = anchor_key(text)
+            self.canv.bookmarkPage(key)
+            self._anchors[key] = self.page
+            self.notify('TOCEntry', (TOC_LEVELS[flowable.style.name], text, self.page, key))
+
+    def build_indexed(self, story, maxPasses=5):
+        """Build the document, reusing the previous build's page map.
+
+        Returns the number of layout passes that were needed.
+        """
+        tocs = [f for f in story if isinstance(f, TableOfContents)]
+        self._indexingFlowables = tocs
+        # as in multiBuild, only the settled pass is saved and per-pass
+        # flowable state (e.g. _postponed) is undone between passes
+        self._doSave = 0
+        edits = []
+        self._multiBuildEdits = edits.append
+        for passes in range(1, maxPasses + 1):
+            self._anchors = {}
+            for toc in tocs:
+                toc._lastEntries = self._toc_entries[:]
+                toc.clearEntries()
+
+            # work with a copy of the story, since it is consumed
+            self.build(story[:])
+
+            toc_entries = tocs[0]._entries if tocs else []
+            settled = self._anchors == self.page_map and toc_entries == self._toc_entries
+            self.page_map.clear()
+            self.page_map.update(self._anchors)
+            self._toc_entries = toc_entries
+            if settled:
+                break
+            while edits:
+                e = edits.pop(0)
+                e[0](*e[1:])
+        else:
+            raise IndexError("Page numbers not settled after %d passes" % maxPasses)
+        del self._multiBuildEdits
+        self.canv.save()
+        self._save_page_map()
+        return passes
@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Compact columnar store for recorded sensor state histories.
+
+Sensors keep logging and transmitting state changes even when automations are
+disabled for Shabbat. This module keeps those histories in an append-only,
+fixed-width columnar format instead of raw JSON lines, so they can be kept for
+review and scanned by device and time range without parsing any JSON.
+
+A store is a directory holding one binary file per column plus a small
+dictionary file for the string-valued fields:
+
+    timestamp.col     int64   milliseconds since the Unix epoch
+    device.col        uint16  index into the device dictionary
+    contact.col       int8    1 = closed, 0 = open, -1 = not reported
+    presence.col      int8    1 = present, 0 = clear, -1 = not reported
+    motion_state.col  uint8   index into the motion_state dictionary, 0 = none
+    illuminance.col   int32   lux, -1 = not reported
+    battery.col       int8    percent, -1 = not reported
+    linkquality.col   int16   lqi, -1 = not reported
+    dictionary.json   {"device": [...], "motion_state": [...]}
+
+Each row is 20 bytes, compared with 100-250 bytes for the equivalent Z2M JSON
+payload. Rows must be appended in timestamp order, which lets time range
+queries binary search the memory-mapped timestamp column.
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+import argparse
+import json
+import mmap
+import sys
+
+# Column name -> array typecode. Order is the on-disk row layout.
+COLUMNS = {
+    'timestamp': 'q',
+    'device': 'H',
+    'contact': 'b',
+    'presence': 'b',
+    'motion_state': 'B',
+    'illuminance': 'i',
+    'battery': 'b',
+    'linkquality': 'h',
+}
+
+# Columns stored as tri-state booleans
+BOOLEAN_COLUMNS = ('contact', 'presence')
+
+# Columns stored as non-negative integers
+NUMERIC_COLUMNS = ('illuminance', 'battery', 'linkquality')
+
+# Sentinel for fields missing from a payload (or null in it)
+NULL = -1
+
+DICTIONARY_FILE = "dictionary.json"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def column_path(store_dir, name):
+    """Return the file path of a column within a store."""
+    return Path(store_dir) / f"{name}.col"
+
+
+def parse_timestamp(value):
+    """Convert an ISO 8601 string or epoch milliseconds to epoch milliseconds."""
+    if isinstance(value, str):
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        # Integer arithmetic; dt.timestamp() * 1000 can be a millisecond short
+        return (dt - EPOCH) // timedelta(milliseconds=1)
+    return int(value)
+
+
+def format_timestamp(ms):
+    """Convert epoch milliseconds to an ISO 8601 UTC string."""
+    dt = EPOCH + timedelta(milliseconds=ms)
+    return dt.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def column_max(name):
+    """Return the largest value a column's type can hold."""
+    typecode = COLUMNS[name]
+    bits = 8 * array(typecode).itemsize
+    return 2 ** bits - 1 if typecode.isupper() else 2 ** (bits - 1) - 1
+
+
+def stored_rows(store_dir):
+    """Return the number of complete rows common to every column of a store.
+
+    Raises ValueError if some column files exist and others are missing,
+    rather than treating the missing ones as empty.
+    """
+    missing = [name for name in COLUMNS if not column_path(store_dir, name).exists()]
+    if missing and len(missing) < len(COLUMNS):
+        raise ValueError(f"Store {store_dir} is missing columns: {', '.join(missing)}")
+    return min(row_count(store_dir, name) for name in COLUMNS)
+
+
+def load_dictionary(store_dir):
+    """Load the string dictionaries of a store (empty if none written yet)."""
+    path = Path(store_dir) / DICTIONARY_FILE
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    # motion_state code 0 is reserved for "not reported"
+    return {'device': [], 'motion_state': [None]}
+
+
+class HistoryWriter:
+    """Append sensor state records to a columnar store.
+
+    Records are buffered in typed arrays and written to the end of each
+    column file on flush(). Existing data is never rewritten.
+    """
+
+    def __init__(self, store_dir, buffer_rows=4096):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.buffer_rows = buffer_rows
+        self.dictionary = load_dictionary(self.store_dir)
+        self._codes = {
+            name: {value: code for code, value in enumerate(values)}
+            for name, values in self.dictionary.items()
+        }
+        self._dictionary_dirty = False
+        self._buffers = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        self._last_timestamp = self._recover()
+
+    def _recover(self):
+        """Trim columns to a common row count after an interrupted flush.
+
+        Returns the last stored timestamp, or None for an empty store.
+        """
+        rows = stored_rows(self.store_dir)
+        for name, typecode in COLUMNS.items():
+            path = column_path(self.store_dir, name)
+            size = rows * array(typecode).itemsize
+            if path.exists() and path.stat().st_size != size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        if rows == 0:
+            return None
+        with open(column_path(self.store_dir, 'timestamp'), 'rb') as f:
+            f.seek((rows - 1) * array('q').itemsize)
+            last = array('q')
+            last.frombytes(f.read())
+        return last[0]
+
+    def _lookup(self, name, value, pending):
+        """Return the dictionary code for a string value.
+
+        New values are given the next free code and recorded in pending;
+        they are only added to the dictionary once the whole row is valid.
+        """
+        if value is None:
+            if name == 'device':
+                raise ValueError("Record has no device")
+            return 0
+        if not isinstance(value, str):
+            raise ValueError(f"{name}: expected a string, got {value!r}")
+        code = self._codes[name].get(value)
+        if code is None:
+            code = len(self.dictionary[name])
+            if code > column_max(name):
+                raise ValueError(f"Too many distinct {name} values")
+            pending.append((name, value, code))
+        return code
+
+    def append(self, device, timestamp, payload):
+        """Append one state record.
+
+        payload is a Z2M state payload such as the sample JSON in the
+        generated documents; fields outside the stored columns are ignored.
+        Raises ValueError, leaving the store unchanged, if a field cannot be
+        stored in its column.
+        """
+        # Encode and check every field before touching any buffer, so a bad
+        # record can never leave the columns with different row counts
+        row = {'timestamp': parse_timestamp(timestamp)}
+        if not 0 <= row['timestamp'] <= column_max('timestamp'):
+            raise ValueError(f"timestamp: {timestamp!r} out of range")
+        if self._last_timestamp is not None and row['timestamp'] < self._last_timestamp:
+            raise ValueError(
+                f"Timestamp {format_timestamp(row['timestamp'])} is earlier than the last "
+                f"stored record ({format_timestamp(self._last_timestamp)})"
+            )
+        pending = []
+        row['device'] = self._lookup('device', device, pending)
+        for name in BOOLEAN_COLUMNS:
+            value = payload.get(name)
+            if value is not None and not isinstance(value, bool):
+                raise ValueError(f"{name}: expected true/false, got {value!r}")
+            row[name] = NULL if value is None else int(value)
+        row['motion_state'] = self._lookup('motion_state', payload.get('motion_state'), pending)
+        for name in NUMERIC_COLUMNS:
+            value = payload.get(name)
+            if value is None:
+                row[name] = NULL
+                continue
+            # Whole numbers only; 12.0 is accepted, 12.5 is not silently truncated
+            if type(value) is float and value.is_integer():
+                value = int(value)
+            if type(value) is not int:
+                raise ValueError(f"{name}: expected a whole number, got {value!r}")
+            if not 0 <= value <= column_max(name):
+                raise ValueError(f"{name}: {value!r} outside 0-{column_max(name)}")
+            row[name] = value
+
+        for name, value, code in pending:
+            self._codes[name][value] = code
+            self.dictionary[name].append(value)
+            self._dictionary_dirty = True
+        for name, buf in self._buffers.items():
+            buf.append(row[name])
+        self._last_timestamp = row['timestamp']
+
+        if len(self._buffers['timestamp']) >= self.buffer_rows:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows to the end of each column file."""
+        # Write the dictionary first so every stored code can be decoded
+        if self._dictionary_dirty:
+            path = self.store_dir / DICTIONARY_FILE
+            tmp = path.with_suffix('.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(self.dictionary, f)
+            tmp.replace(path)
+            self._dictionary_dirty = False
+        for name, buf in self._buffers.items():
+            if buf:
+                with open(column_path(self.store_dir, name), 'ab') as f:
+                    buf.tofile(f)
+                del buf[:]
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def row_count(store_dir, name):
+    """Return the number of complete rows in a column file."""
+    path = column_path(store_dir, name)
+    if not path.exists():
+        return 0
+    return path.stat().st_size // array(COLUMNS[name]).itemsize
+
+
+class HistoryReader:
+    """Query a columnar store through memory-mapped, zero-copy column views."""
+
+    def __init__(self, store_dir):
+        self.store_dir = Path(store_dir)
+        self.dictionary = load_dictionary(self.store_dir)
+        self.rows = stored_rows(self.store_dir)
+        self._maps = []
+        self.columns = {}
+        for name, typecode in COLUMNS.items():
+            if self.rows == 0:
+                self.columns[name] = memoryview(array(typecode))
+                continue
+            with open(column_path(self.store_dir, name), 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mapped)
+            itemsize = array(typecode).itemsize
+            self.columns[name] = memoryview(mapped)[:self.rows * itemsize].cast(typecode)
+
+    def close(self):
+        for view in self.columns.values():
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self.columns = {}
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.rows
+
+    def time_range(self, start=None, end=None):
+        """Return the (first, stop) row slice covering [start, end)."""
+        timestamps = self.columns['timestamp']
+        first = 0 if start is None else bisect_left(timestamps, parse_timestamp(start))
+        stop = self.rows if end is None else bisect_left(timestamps, parse_timestamp(end), first)
+        return first, stop
+
+    def select(self, device=None, start=None, end=None):
+        """Return the row indexes matching a device and/or time range."""
+        first, stop = self.time_range(start, end)
+        if device is None:
+            return range(first, stop)
+        try:
+            code = self.dictionary['device'].index(device)
+        except ValueError:
+            return []
+        devices = self.columns['device']
+        return [i for i in range(first, stop) if devices[i] == code]
+
+    def record(self, i):
+        """Decode row i back into a Z2M-style state dict."""
+        cols = self.columns
+        record = {
+            'timestamp': format_timestamp(cols['timestamp'][i]),
+            'device': self.dictionary['device'][cols['device'][i]],
+        }
+        for name in BOOLEAN_COLUMNS:
+            if cols[name][i] != NULL:
+                record[name] = bool(cols[name][i])
+        if cols['motion_state'][i]:
+            record['motion_state'] = self.dictionary['motion_state'][cols['motion_state'][i]]
+        for name in NUMERIC_COLUMNS:
+            if cols[name][i] != NULL:
+                record[name] = cols[name][i]
+        return record
+
+    def query(self, device=None, start=None, end=None):
+        """Yield decoded records matching a device and/or time range."""
+        for i in self.select(device, start, end):
+            yield self.record(i)
+
+
+def ingest_jsonl(store_dir, lines):
+    """Append JSON lines of the form {"device", "timestamp", ...payload}.
+
+    Returns the number of records ingested. Raises ValueError naming the
+    line number for the first line that cannot be stored; the records
+    before it are kept.
+    """
+    count = 0
+    with HistoryWriter(store_dir) as writer:
+        for lineno, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+                if not isinstance(payload, dict):
+                    raise ValueError("expected a JSON object")
+                for key in ('device', 'timestamp'):
+                    if key not in payload:
+                        raise ValueError(f"record has no {key}")
+                writer.append(payload.pop('device'), payload.pop('timestamp'), payload)
+            except ValueError as e:
+                raise ValueError(f"line {lineno}: {e} ({count} records before it ingested)") from None
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help="Append JSON lines to a store")
+    ingest.add_argument('store')
+    ingest.add_argument('files', nargs='*', help="JSON lines files (default: stdin)")
+
+    query = subparsers.add_parser('query', help="Print records as JSON lines")
+    query.add_argument('store')
+    query.add_argument('--device')
+    query.add_argument('--start', help="ISO 8601 timestamp (inclusive)")
+    query.add_argument('--end', help="ISO 8601 timestamp (exclusive)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        count = 0
+        try:
+            if args.files:
+                for path in args.files:
+                    with open(path) as f:
+                        try:
+                            count += ingest_jsonl(args.store, f)
+                        except ValueError as e:
+                            raise ValueError(f"{path}: {e}") from None
+            else:
+                count = ingest_jsonl(args.store, sys.stdin)
+        except ValueError as e:
+            sys.exit(f"Error: {e}")
+        print(f"Ingested {count} records into {args.store}")
+    else:
+        with HistoryReader(args.store) as reader:
+            for record in reader.query(args.device, args.start, args.end):
+                print(json.dumps(record))
+
+
+if __name__ == "__main__":
+    main()